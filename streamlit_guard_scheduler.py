@@ -11,8 +11,8 @@ import numpy as np
 from datetime import datetime, timedelta, date
 import gspread
 from google.oauth2.service_account import Credentials
-from collections import defaultdict
 import calendar
+import hashlib
 
 # ──────────────────────────────────────────────────────────
 # CONFIGURARE
@@ -23,6 +23,10 @@ st.set_page_config(
     layout="wide"
 )
 
+# Foile din Google Sheets
+SHEET_DOCTORS = "Doctors"
+SHEET_SCHEDULE = "Schedule"
+
 # Constante pentru coloane
 COL_ID = "id"
 COL_NAME = "name"
@@ -77,34 +81,70 @@ def get_sheet_id():
         st.error("Lipsește sheet_id în secrets.toml!")
         st.stop()
 
-@st.cache_data(ttl=300)  # Cache pentru 5 minute
-def load_data(sheet_name):
-    """Încarcă date din Google Sheets cu error handling robust."""
+@st.cache_resource(show_spinner=False)
+def get_spreadsheet(sheet_id):
+    """Deschide spreadsheet-ul o singură dată - open_by_key face un apel de metadate."""
+    return get_gsheet_client().open_by_key(sheet_id)
+
+def values_to_df(columns):
+    """Construiește un DataFrame din coloanele brute ale unei foi (primul element = header)."""
+    # Ignoră coloanele de la final fără header, ca la citirea pe rânduri
+    while columns and not (columns[-1] and columns[-1][0] != ''):
+        columns = columns[:-1]
+    
+    n_rows = max((len(col) for col in columns), default=0) - 1
+    if n_rows < 1:
+        return pd.DataFrame()
+    
+    # API-ul omite celulele goale de la finalul coloanei - completează cu string gol;
+    # construcția pe coloane evită transpunerea unei liste de rânduri
+    headers = [col[0] if col else '' for col in columns]
+    df = pd.DataFrame({
+        i: col[1:] + [''] * (n_rows + 1 - max(len(col), 1))
+        for i, col in enumerate(columns)
+    })
+    df.columns = headers
+    return df
+
+@st.cache_data(ttl=300, show_spinner=False)  # Cache pentru 5 minute, per sheet_id
+def load_all_data(sheet_id, sheet_names):
+    """Încarcă toate foile cerute într-un singur apel batchGet către Google Sheets."""
+    data = {name: pd.DataFrame() for name in sheet_names}
     try:
-        client = get_gsheet_client()
-        sheet_id = get_sheet_id()
-        sh = client.open_by_key(sheet_id)
+        sh = get_spreadsheet(sheet_id)
         
-        # Încearcă să obțină worksheet-ul
+        names = list(sheet_names)
         try:
-            worksheet = sh.worksheet(sheet_name)
-            data = worksheet.get_all_records()
-            
-            if not data:
-                return pd.DataFrame()
-                
-            df = pd.DataFrame(data)
-            # Convertește coloanele goale în string gol
-            df = df.fillna('')
-            return df
-            
-        except gspread.exceptions.WorksheetNotFound:
-            # Dacă foaia nu există, returnează DataFrame gol
-            return pd.DataFrame()
-            
+            response = sh.values_batch_get(
+                [f"'{name}'" for name in names], params={'majorDimension': 'COLUMNS'}
+            )
+        except gspread.exceptions.APIError:
+            # O foaie inexistentă face să eșueze tot batchGet-ul - abia acum
+            # listăm foile și cerem doar foile existente; cele lipsă rămân goale
+            existing = {ws.title for ws in sh.worksheets()}
+            names = [name for name in sheet_names if name in existing]
+            if not names:
+                return data
+            response = sh.values_batch_get(
+                [f"'{name}'" for name in names], params={'majorDimension': 'COLUMNS'}
+            )
+        
+        for name, value_range in zip(names, response.get('valueRanges', [])):
+            data[name] = values_to_df(value_range.get('values', []))
+        return data
+        
     except Exception as e:
-        st.error(f"Eroare la încărcare date din {sheet_name}: {str(e)}")
-        return pd.DataFrame()
+        st.error(f"Eroare la încărcare date: {str(e)}")
+        return data
+
+@st.cache_resource(show_spinner=False)
+def get_worksheet(sheet_id, sheet_name):
+    """Găsește sau creează worksheet-ul o singură dată per foaie, nu la fiecare salvare."""
+    sh = get_spreadsheet(sheet_id)
+    try:
+        return sh.worksheet(sheet_name)
+    except gspread.exceptions.WorksheetNotFound:
+        return sh.add_worksheet(title=sheet_name, rows=1000, cols=20)
 
 def save_data(sheet_name, df):
     """Salvează date în Google Sheets cu error handling."""
@@ -112,37 +152,36 @@ def save_data(sheet_name, df):
         return
         
     try:
-        client = get_gsheet_client()
-        sheet_id = get_sheet_id()
-        sh = client.open_by_key(sheet_id)
-        
-        # Încearcă să găsească sau să creeze worksheet-ul
-        try:
-            worksheet = sh.worksheet(sheet_name)
-            worksheet.clear()
-        except gspread.exceptions.WorksheetNotFound:
-            worksheet = sh.add_worksheet(title=sheet_name, rows=1000, cols=20)
+        worksheet = get_worksheet(get_sheet_id(), sheet_name)
         
         # Pregătește datele pentru salvare
         headers = df.columns.tolist()
-        values = df.fillna('').astype(str).values.tolist()
+        # Conversie pe coloane la șiruri (NA -> ''), apoi transpunere în rânduri;
+        # evită copia 2D de obiecte și merge și pe coloane Int64/categoriale
+        columns = [df[col].astype('string').fillna('').tolist() for col in headers]
+        body = [headers] + [list(row) for row in zip(*columns)]
+        
+        # Redimensionează foaia exact cât datele noi - rândurile și coloanele
+        # vechi dispar odată cu grila, fără un clear() separat pe toată foaia
+        worksheet.resize(rows=len(body), cols=len(headers))
         
         # Salvează datele
-        if values:  # Doar dacă avem date
-            worksheet.update([headers] + values, value_input_option='USER_ENTERED')
-        else:
-            worksheet.update([headers], value_input_option='USER_ENTERED')
+        worksheet.update(values=body, range_name='A1', value_input_option='USER_ENTERED')
             
-        # Invalidate cache
-        load_data.clear()
+        # Invalidate cache - o singură intrare de cache conține ambele foi
+        # (batchGet), deci o golim complet după orice scriere
+        load_all_data.clear()
         
     except Exception as e:
+        # Foaia ar fi putut fi ștearsă între timp - o căutăm din nou data viitoare
+        get_worksheet.clear()
         st.error(f"Eroare la salvare în {sheet_name}: {str(e)}")
 
 # ──────────────────────────────────────────────────────────
 # FUNCȚII PENTRU GESTIONAREA DATELOR
 # ──────────────────────────────────────────────────────────
 
+@st.cache_data(show_spinner=False)
 def clean_doctors_data(doctors_df):
     """Curăță și validează datele medicilor."""
     if doctors_df.empty:
@@ -164,16 +203,87 @@ def clean_doctors_data(doctors_df):
     
     return doctors_df
 
+@st.cache_data(show_spinner=False)
+def clean_schedule_data(schedule_df, doctors_df):
+    """Normalizează tipurile coloanelor din program (ID-uri, tipuri de gardă, date)."""
+    if schedule_df.empty:
+        return schedule_df
+
+    # Asigură că toate coloanele necesare există
+    for col in [COL_DATE, COL_SHIFT, COL_DOC_ID]:
+        if col not in schedule_df.columns:
+            schedule_df[col] = ''
+
+    # ID-urile și tipurile de gardă au cardinalitate mică - le păstrăm ca
+    # categorii, cu aceleași categorii ca lista de medici
+    # Valorile neîntregi sau în afara int64 (ex. 1.5, 1e30) devin NA înainte de
+    # conversie - altfel cast-ul la Int64 eșuează; se afișează apoi ca "?"
+    doc_ids = pd.to_numeric(schedule_df[COL_DOC_ID], errors='coerce')
+    doc_ids = doc_ids.where((doc_ids % 1 == 0) & (doc_ids.abs() < 2**63)).astype('Int64')
+    known_ids = doctors_df[COL_ID] if not doctors_df.empty else pd.Series(dtype=int)
+    categories = pd.Index(known_ids.unique()).union(pd.Index(doc_ids.dropna().unique()))
+    schedule_df[COL_DOC_ID] = doc_ids.astype(pd.CategoricalDtype(categories))
+    schedule_df[COL_SHIFT] = schedule_df[COL_SHIFT].astype(str).astype('category')
+
+    # Parsează datele o singură dată; vizualizările folosesc doar 'date_parsed'.
+    # Formatul explicit e rapid, iar celulele editate manual în alt format
+    # trec prin parserul generic
+    dates = pd.to_datetime(schedule_df[COL_DATE], format='%Y-%m-%d', errors='coerce')
+    unparsed = dates.isna() & (schedule_df[COL_DATE].astype(str) != '')
+    if unparsed.any():
+        dates[unparsed] = pd.to_datetime(schedule_df.loc[unparsed, COL_DATE], errors='coerce')
+    schedule_df['date_parsed'] = dates
+
+    return schedule_df
+
+def period_mask(schedule_df, start_date, end_date):
+    """Mască pentru gărzile dintre două date (inclusiv), calculată direct pe datetime64."""
+    # Comparăm timestamp-uri în loc de .dt.date, care creează câte un obiect date per rând
+    days = schedule_df['date_parsed'].dt.normalize()
+    return days.between(pd.Timestamp(start_date), pd.Timestamp(end_date))
+
+def format_days(dates, fmt):
+    """Formatează datele o singură dată per zi distinctă, nu pentru fiecare rând."""
+    codes, days = pd.factorize(dates.dt.normalize())
+    # Codul -1 (dată lipsă) indexează ultimul element - un string gol
+    labels = np.append(pd.DatetimeIndex(days).strftime(fmt).to_numpy(dtype=object), '')
+    return pd.Series(labels[codes], index=dates.index)
+
+@st.cache_data(show_spinner=False)
 def get_doctor_name_map(doctors_df):
     """Creează mapping ID -> Nume pentru afișare."""
     if doctors_df.empty:
         return {}
-    return dict(zip(doctors_df[COL_ID], doctors_df[COL_NAME]))
+    return dict(zip(doctors_df[COL_ID].to_numpy(), doctors_df[COL_NAME].to_numpy()))
+
+@st.cache_data(show_spinner=False)
+def get_doctor_spec_map(doctors_df):
+    """Creează mapping ID -> Specialitate pentru afișare."""
+    if doctors_df.empty:
+        return {}
+    return dict(zip(doctors_df[COL_ID].to_numpy(), doctors_df[COL_SPEC].to_numpy()))
+
+def map_doctor_names(doc_ids, name_map):
+    """Mapează vectorizat ID-urile la nume; ID-urile necunoscute devin "ID x", cele lipsă "?"."""
+    # Pe coloana categorială maparea se face o dată per categorie, nu per rând
+    names = doc_ids.map(name_map).astype(object)
+    missing = names.isna()
+    if missing.any():
+        names[missing] = [f"ID {doc_id}" if pd.notna(doc_id) else "?" for doc_id in doc_ids[missing]]
+    return names
 
 # ──────────────────────────────────────────────────────────
 # INTERFAȚĂ UTILIZATOR - VIZUALIZARE CALENDAR
 # ──────────────────────────────────────────────────────────
 
+def shift_emoji(shift_type):
+    """Emoji pentru tipul de gardă, folosit în calendar."""
+    if "24h" in shift_type:
+        return "🔴"
+    elif "Zi" in shift_type:
+        return "🟢"
+    return "🔵"
+
 def show_monthly_calendar(schedule_df, doctors_df, year, month):
     """Afișează calendar lunar folosind doar componente Streamlit."""
     
@@ -182,15 +292,20 @@ def show_monthly_calendar(schedule_df, doctors_df, year, month):
     # Obține maparea numelor
     name_map = get_doctor_name_map(doctors_df)
     
-    # Pregătește datele pentru luna selectată
+    # Pregătește o singură dată etichetele gărzilor din lună, grupate pe zi;
+    # celulele calendarului fac doar o căutare în dicționar
+    day_captions = {}
     if not schedule_df.empty:
-        schedule_df['date_parsed'] = pd.to_datetime(schedule_df[COL_DATE], errors='coerce')
-        month_schedule = schedule_df[
-            (schedule_df['date_parsed'].dt.year == year) & 
-            (schedule_df['date_parsed'].dt.month == month)
+        dates = schedule_df['date_parsed']
+        month_schedule = schedule_df.loc[
+            (dates.dt.year == year) & (dates.dt.month == month), ['date_parsed', COL_SHIFT, COL_DOC_ID]
         ]
-    else:
-        month_schedule = pd.DataFrame()
+        doc_names = month_schedule[COL_DOC_ID].map(name_map).astype(object).fillna("?")
+        short_names = doc_names.astype(str).str.split().str[0].fillna("?")
+        emojis = month_schedule[COL_SHIFT].map(shift_emoji)  # o dată per categorie
+        
+        for day, emoji, short_name in zip(month_schedule['date_parsed'].dt.day, emojis, short_names):
+            day_captions.setdefault(day, []).append(f"{emoji} {short_name}")
     
     # Obține structura calendarului pentru lună
     cal = calendar.monthcalendar(year, month)
@@ -204,52 +319,55 @@ def show_monthly_calendar(schedule_df, doctors_df, year, month):
             else:
                 st.markdown(f"**{day}**")
     
-    # Afișează zilele
+    # Afișează zilele - un singur element pentru ziua din lună și unul pentru
+    # toate gărzile ei; celulele goale rămân coloane goale, fără elemente
     for week in cal:
         week_cols = st.columns(7)
         for i, day in enumerate(week):
             if day > 0:
                 with week_cols[i]:
-                    # Container pentru zi
-                    with st.container():
-                        # Afișează ziua
-                        if i >= 5:  # Weekend
-                            st.markdown(f"**:orange[{day}]**")
-                        else:
-                            st.markdown(f"**{day}**")
-                        
-                        # Găsește gărzi pentru această zi
-                        if not month_schedule.empty:
-                            day_date = date(year, month, day)
-                            day_shifts = month_schedule[
-                                month_schedule['date_parsed'].dt.date == day_date
-                            ]
-                            
-                            # Afișează gărzile
-                            for _, shift in day_shifts.iterrows():
-                                doc_name = name_map.get(shift[COL_DOC_ID], "?")
-                                shift_type = shift[COL_SHIFT]
-                                
-                                # Folosește emoji pentru tipul de gardă
-                                if "24h" in shift_type:
-                                    emoji = "🔴"
-                                elif "Zi" in shift_type:
-                                    emoji = "🟢"
-                                else:
-                                    emoji = "🔵"
-                                
-                                # Afișează numele prescurtat
-                                short_name = doc_name.split()[0] if doc_name != "?" else "?"
-                                st.caption(f"{emoji} {short_name}")
-            else:
-                # Zi goală
-                with week_cols[i]:
-                    st.write("")
+                    # Afișează ziua
+                    if i >= 5:  # Weekend
+                        st.markdown(f"**:orange[{day}]**")
+                    else:
+                        st.markdown(f"**{day}**")
+                    
+                    # Afișează gărzile zilei
+                    captions = day_captions.get(day)
+                    if captions:
+                        st.caption("  \n".join(captions))
 
 # ──────────────────────────────────────────────────────────
 # INTERFAȚĂ UTILIZATOR - VIZUALIZARE GANTT SIMPLĂ
 # ──────────────────────────────────────────────────────────
 
+def shift_short_label(shift_type):
+    """Prescurtează tipul de gardă pentru afișare compactă."""
+    if "24h" in shift_type:
+        return "24h"
+    elif "Zi" in shift_type:
+        return "Zi"
+    return "Noapte"
+
+@st.cache_data(show_spinner=False)
+def build_gantt_table(filtered, date_labels):
+    """Construiește tabelul medici × zile cu un singur groupby + unstack."""
+    cells = (
+        filtered.assign(
+            day=format_days(filtered['date_parsed'], '%d.%m'),
+            # Pe coloana categorială prescurtarea se calculează o dată per tip de gardă
+            short=filtered[COL_SHIFT].map(shift_short_label).astype(str)
+        )
+        .groupby(['doctor_name', 'day'], sort=False)['short']
+        .agg(', '.join)
+        .unstack('day')
+    )
+    
+    table = cells.reindex(columns=list(date_labels)).fillna('').sort_index()
+    table.index.name = 'Medic'
+    table.columns.name = None
+    return table.reset_index()
+
 def show_simple_gantt(schedule_df, doctors_df, start_date, end_date):
     """Vizualizare Gantt simplă folosind dataframe-uri Streamlit."""
     
@@ -258,73 +376,32 @@ def show_simple_gantt(schedule_df, doctors_df, start_date, end_date):
         return
     
     # Pregătește datele
-    schedule_df['date_parsed'] = pd.to_datetime(schedule_df[COL_DATE], errors='coerce')
-    mask = (schedule_df['date_parsed'].dt.date >= start_date) & (schedule_df['date_parsed'].dt.date <= end_date)
-    filtered = schedule_df[mask].copy()
+    mask = period_mask(schedule_df, start_date, end_date)
+    # Doar coloanele necesare - fără copia completă a programului
+    filtered = schedule_df.loc[mask, ['date_parsed', COL_SHIFT, COL_DOC_ID]]
     
     if filtered.empty:
         st.info("Nu există gărzi în perioada selectată.")
         return
     
-    # Obține mapping nume
+    # Mapează numele medicilor o singură dată, vectorizat
     name_map = get_doctor_name_map(doctors_df)
+    filtered = filtered.assign(doctor_name=map_doctor_names(filtered[COL_DOC_ID], name_map))
     
-    # Creează un DataFrame pentru vizualizare
-    # Vom crea un tabel cu medicii pe rânduri și datele pe coloane
-    date_range = pd.date_range(start_date, end_date)
-    gantt_data = {}
+    # Tabel cu medicii pe rânduri și datele pe coloane
+    date_labels = tuple(pd.date_range(start_date, end_date).strftime('%d.%m').unique())
+    df_display = build_gantt_table(filtered[['doctor_name', 'date_parsed', COL_SHIFT]], date_labels)
     
-    # Inițializează cu string-uri goale
-    for date_val in date_range:
-        gantt_data[date_val.strftime('%d.%m')] = {}
+    # Afișează ca tabel
+    st.dataframe(
+        df_display,
+        use_container_width=True,
+        hide_index=True,
+        height=min(600, len(df_display) * 35 + 100)
+    )
     
-    # Populează cu date
-    for _, shift in filtered.iterrows():
-        doc_name = name_map.get(shift[COL_DOC_ID], f"ID {shift[COL_DOC_ID]}")
-        shift_date = shift['date_parsed'].strftime('%d.%m')
-        shift_type = shift[COL_SHIFT]
-        
-        # Prescurtează tipul de gardă
-        if "24h" in shift_type:
-            shift_short = "24h"
-        elif "Zi" in shift_type:
-            shift_short = "Zi"
-        else:
-            shift_short = "Noapte"
-        
-        if shift_date in gantt_data:
-            if doc_name not in gantt_data[shift_date]:
-                gantt_data[shift_date][doc_name] = shift_short
-            else:
-                gantt_data[shift_date][doc_name] += f", {shift_short}"
-    
-    # Convertește în DataFrame pentru afișare
-    if gantt_data:
-        # Obține lista unică de medici
-        all_doctors = set()
-        for date_shifts in gantt_data.values():
-            all_doctors.update(date_shifts.keys())
-        
-        # Creează DataFrame
-        display_data = []
-        for doc in sorted(all_doctors):
-            row = {'Medic': doc}
-            for date_str in gantt_data.keys():
-                row[date_str] = gantt_data[date_str].get(doc, '')
-            display_data.append(row)
-        
-        df_display = pd.DataFrame(display_data)
-        
-        # Afișează ca tabel
-        st.dataframe(
-            df_display,
-            use_container_width=True,
-            hide_index=True,
-            height=min(600, len(all_doctors) * 35 + 100)
-        )
-        
-        # Legendă
-        st.caption("🔴 24h | 🟢 Zi (08-20) | 🔵 Noapte (20-08)")
+    # Legendă
+    st.caption("🔴 24h | 🟢 Zi (08-20) | 🔵 Noapte (20-08)")
 
 # ──────────────────────────────────────────────────────────
 # INTERFAȚĂ UTILIZATOR - VIZUALIZARE TABEL
@@ -338,9 +415,8 @@ def show_schedule_table(schedule_df, doctors_df, start_date, end_date):
         return
     
     # Pregătește datele
-    schedule_df['date_parsed'] = pd.to_datetime(schedule_df[COL_DATE], errors='coerce')
-    mask = (schedule_df['date_parsed'].dt.date >= start_date) & (schedule_df['date_parsed'].dt.date <= end_date)
-    filtered = schedule_df[mask].copy()
+    mask = period_mask(schedule_df, start_date, end_date)
+    filtered = schedule_df.loc[mask, ['date_parsed', COL_SHIFT, COL_DOC_ID]]
     
     if filtered.empty:
         st.info("Nu există gărzi în perioada selectată.")
@@ -348,22 +424,20 @@ def show_schedule_table(schedule_df, doctors_df, start_date, end_date):
     
     # Mapping pentru nume și specialități
     name_map = get_doctor_name_map(doctors_df)
-    spec_map = dict(zip(doctors_df[COL_ID], doctors_df[COL_SPEC])) if not doctors_df.empty else {}
-    
-    # Pregătește datele pentru afișare
-    display_data = []
-    for _, row in filtered.iterrows():
-        display_data.append({
-            'Data': row['date_parsed'].strftime('%d.%m.%Y'),
-            'Zi': WEEKDAYS_RO[row['date_parsed'].weekday()],
-            'Tip Gardă': row[COL_SHIFT],
-            'Medic': name_map.get(row[COL_DOC_ID], f"ID {row[COL_DOC_ID]}"),
-            'Specialitate': spec_map.get(row[COL_DOC_ID], '-')
-        })
-    
-    # Sortează după dată
-    df_display = pd.DataFrame(display_data)
-    df_display = df_display.sort_values('Data')
+    spec_map = get_doctor_spec_map(doctors_df)
+    
+    # Sortează după dată (stabil, păstrează ordinea gărzilor din aceeași zi)
+    filtered = filtered.sort_values('date_parsed', kind='stable')
+    weekdays = filtered['date_parsed'].dt.weekday.to_numpy()
+    
+    # Pregătește datele pentru afișare - formatare vectorizată, fără iterrows
+    df_display = pd.DataFrame({
+        'Data': format_days(filtered['date_parsed'], '%d.%m.%Y').to_numpy(),
+        'Zi': np.array(WEEKDAYS_RO)[weekdays],
+        'Tip Gardă': filtered[COL_SHIFT].to_numpy(),
+        'Medic': map_doctor_names(filtered[COL_DOC_ID], name_map).to_numpy(),
+        'Specialitate': filtered[COL_DOC_ID].map(spec_map).astype(object).fillna('-').to_numpy()
+    })
     
     # Afișează tabelul
     st.dataframe(
@@ -381,13 +455,50 @@ def show_schedule_table(schedule_df, doctors_df, start_date, end_date):
         unique_docs = filtered[COL_DOC_ID].nunique()
         st.metric("Medici Activi", unique_docs)
     with col3:
-        weekend_count = sum(1 for d in display_data if d['Zi'] in ['Sâmbătă', 'Duminică'])
+        weekend_count = int((weekdays >= 5).sum())
         st.metric("Gărzi Weekend", weekend_count)
 
 # ──────────────────────────────────────────────────────────
 # FUNCȚII PENTRU GENERARE PROGRAM
 # ──────────────────────────────────────────────────────────
 
+def assign_round_robin(month_idx, n_shifts, max_per_doctor):
+    """Nucleul round-robin: lucrează doar cu poziții întregi.
+
+    Pentru fiecare zi (indexul lunii în `month_idx`) și fiecare gardă întoarce
+    poziția medicului ales în listă sau -1 dacă toți și-au atins limita lunară,
+    ca array int64 pe ambele ramuri (rapidă și secvențială).
+    """
+    n_doctors = len(max_per_doctor)
+    
+    # Un medic primește cel mult ceil(sloturi_lună / n) gărzi într-o lună de ciclu
+    # simplu; dacă nicio limită nu poate fi atinsă, alocarea e doar un modulo
+    slots_per_month = np.bincount(np.asarray(month_idx, dtype=np.int64)) * n_shifts
+    if n_doctors and slots_per_month.size and -(-slots_per_month.max() // n_doctors) <= min(max_per_doctor):
+        return np.arange(len(month_idx) * n_shifts, dtype=np.int64) % n_doctors
+    
+    n_months = max(month_idx) + 1 if month_idx else 0
+    counts = [[0] * n_doctors for _ in range(n_months)]
+    assigned = []
+    doctor_index = 0
+    
+    for month in month_idx:
+        month_counts = counts[month]
+        for _ in range(n_shifts):
+            chosen = -1
+            for _ in range(n_doctors):
+                pos = doctor_index % n_doctors
+                doctor_index += 1
+                # Verifică dacă nu a depășit limita lunară
+                if month_counts[pos] < max_per_doctor[pos]:
+                    month_counts[pos] += 1
+                    chosen = pos
+                    break
+            assigned.append(chosen)
+    
+    return np.asarray(assigned, dtype=np.int64)
+
+@st.cache_data(show_spinner=False)
 def generate_schedule(doctors_df, start_date, end_date, shift_types):
     """Generează program folosind algoritm round-robin simplu."""
     
@@ -399,45 +510,72 @@ def generate_schedule(doctors_df, start_date, end_date, shift_types):
         st.error("Selectează cel puțin un tip de gardă!")
         return pd.DataFrame()
     
-    # Inițializare
-    schedule_rows = []
-    doctor_list = doctors_df[COL_ID].tolist()
-    doctor_index = 0
-    shifts_count = defaultdict(int)
-    max_shifts = dict(zip(doctors_df[COL_ID], doctors_df[COL_MAX]))
-    
-    # Generare pentru fiecare zi
-    current_date = start_date
-    while current_date <= end_date:
-        for shift_type in shift_types:
-            # Găsește următorul medic disponibil
-            attempts = 0
-            assigned = False
-            
-            while attempts < len(doctor_list) and not assigned:
-                doc_id = doctor_list[doctor_index % len(doctor_list)]
-                month_key = f"{current_date.year}-{current_date.month}"
-                
-                # Verifică dacă nu a depășit limita lunară
-                if shifts_count[f"{doc_id}_{month_key}"] < max_shifts.get(doc_id, 8):
-                    # Atribuie garda
-                    schedule_rows.append({
-                        COL_DATE: current_date.strftime('%Y-%m-%d'),
-                        COL_SHIFT: shift_type,
-                        COL_DOC_ID: doc_id
-                    })
-                    shifts_count[f"{doc_id}_{month_key}"] += 1
-                    assigned = True
-                
-                doctor_index += 1
-                attempts += 1
-            
-            if not assigned:
-                st.warning(f"Nu s-a putut aloca gardă pentru {current_date.strftime('%d.%m.%Y')} - {shift_type}")
-        
-        current_date += timedelta(days=1)
-    
-    return pd.DataFrame(schedule_rows)
+    # Inițializare - nucleul lucrează pe poziții întregi (medic, lună);
+    # ID-urile reale se recuperează la final prin indexare în coloana de ID-uri
+    max_per_doctor = doctors_df[COL_MAX].tolist()
+    days = pd.date_range(start_date, end_date, freq='D')
+    month_idx = ((days.year - start_date.year) * 12 + days.month - start_date.month).tolist()
+    
+    n_shifts = len(shift_types)
+    assigned = assign_round_robin(month_idx, n_shifts, max_per_doctor)
+    
+    # Sloturile (zi, gardă) sunt o progresie simplă - le construim vectorizat
+    day_pos = np.repeat(np.arange(len(days)), n_shifts)
+    shift_pos = np.tile(np.arange(n_shifts), len(days))
+    ok = assigned >= 0
+    
+    for slot in np.flatnonzero(~ok):
+        st.warning(f"Nu s-a putut aloca gardă pentru {days[day_pos[slot]].strftime('%d.%m.%Y')} - {shift_types[shift_pos[slot]]}")
+    
+    date_strs = days.strftime('%Y-%m-%d').to_numpy()
+    return pd.DataFrame({
+        COL_DATE: date_strs[day_pos[ok]],
+        # Pozițiile gărzilor sunt direct codurile categoriale - fără copii ale etichetelor per rând
+        COL_SHIFT: pd.Categorical.from_codes(shift_pos[ok], categories=list(shift_types)),
+        COL_DOC_ID: doctors_df[COL_ID].to_numpy()[assigned[ok]]
+    })
+
+def schedule_digest(schedule_df):
+    """Amprentă a conținutului programului, pentru a evita scrieri identice."""
+    if schedule_df.empty:
+        return None
+    columns = [COL_DATE, COL_SHIFT, COL_DOC_ID]
+    if any(col not in schedule_df.columns for col in columns):
+        return None
+    hashes = pd.util.hash_pandas_object(schedule_df[columns].astype(str), index=False)
+    return hashlib.sha1(hashes.to_numpy().tobytes()).hexdigest()
+
+# ──────────────────────────────────────────────────────────
+# FUNCȚII PENTRU EXPORT
+# ──────────────────────────────────────────────────────────
+
+@st.cache_data(show_spinner=False)
+def build_export_lines(schedule_df, doctors_df):
+    """Construiește liniile programului pentru export; antetul cu ora generării rămâne în afara cache-ului."""
+    name_map = get_doctor_name_map(doctors_df)
+    schedule_sorted = schedule_df.loc[
+        schedule_df['date_parsed'].notna(), ['date_parsed', COL_SHIFT, COL_DOC_ID]
+    ].sort_values('date_parsed', kind='stable')
+    dates = schedule_sorted['date_parsed']
+
+    # Liniile se construiesc pe coloane întregi, fără iterare pe rânduri;
+    # data se formatează o dată per zi distinctă
+    weekdays = pd.Series(np.array(WEEKDAYS_RO)[dates.dt.weekday.to_numpy()], index=dates.index)
+    lines = (
+        weekdays + ', ' + format_days(dates, '%d.%m.%Y') + ': '
+        + schedule_sorted[COL_SHIFT].astype(str) + ' - '
+        + map_doctor_names(schedule_sorted[COL_DOC_ID], name_map).astype(str)
+    )
+    return lines.tolist()
+
+def build_export_text(schedule_df, doctors_df):
+    """Construiește conținutul text pentru exportul programului."""
+    export_lines = ["PROGRAM GĂRZI MEDICALE", "=" * 40, ""]
+    export_lines.append(f"Generat: {datetime.now().strftime('%d.%m.%Y %H:%M')}")
+    export_lines.append("")
+    export_lines.extend(build_export_lines(schedule_df, doctors_df))
+
+    return "\n".join(export_lines)
 
 # ──────────────────────────────────────────────────────────
 # APLICAȚIA PRINCIPALĂ
@@ -452,11 +590,13 @@ def main():
     
     # Încarcă datele
     with st.spinner("Se încarcă datele..."):
-        doctors_df = load_data("Doctors")
-        schedule_df = load_data("Schedule")
+        data = load_all_data(get_sheet_id(), (SHEET_DOCTORS, SHEET_SCHEDULE))
+        doctors_df = data[SHEET_DOCTORS]
+        schedule_df = data[SHEET_SCHEDULE]
         
-        # Curăță datele medicilor
+        # Curăță datele medicilor și ale programului
         doctors_df = clean_doctors_data(doctors_df)
+        schedule_df = clean_schedule_data(schedule_df, doctors_df)
     
     # Sidebar pentru navigare și acțiuni
     with st.sidebar:
@@ -493,9 +633,14 @@ def main():
                 if gen_start <= gen_end:
                     new_schedule = generate_schedule(doctors_df, gen_start, gen_end, selected_shifts)
                     if not new_schedule.empty:
-                        save_data("Schedule", new_schedule)
-                        st.success("✅ Program generat cu succes!")
-                        st.rerun()
+                        if schedule_digest(new_schedule) == schedule_digest(schedule_df):
+                            # Nimic nou de scris - evităm un apel de scriere către Sheets
+                            st.info("Programul generat este identic cu cel salvat.")
+                        else:
+                            with st.spinner("Se salvează programul..."):
+                                save_data(SHEET_SCHEDULE, new_schedule)
+                            st.success("✅ Program generat cu succes!")
+                            st.rerun()
                 else:
                     st.error("Data de început trebuie să fie înainte de data de sfârșit!")
             
@@ -503,33 +648,16 @@ def main():
             st.divider()
             if st.button("🗑️ Șterge Tot Programul", type="secondary", use_container_width=True):
                 if st.checkbox("Confirmă ștergerea"):
-                    save_data("Schedule", pd.DataFrame())
+                    save_data(SHEET_SCHEDULE, pd.DataFrame())
                     st.success("Program șters!")
                     st.rerun()
         
-        # Export
+        # Export - textul se construiește doar când utilizatorul cere exportul,
+        # nu la fiecare rerun
         st.divider()
-        if not schedule_df.empty:
-            # Generează conținut pentru export
-            export_lines = ["PROGRAM GĂRZI MEDICALE", "=" * 40, ""]
-            export_lines.append(f"Generat: {datetime.now().strftime('%d.%m.%Y %H:%M')}")
-            export_lines.append("")
-            
-            # Sortează și formatează
-            name_map = get_doctor_name_map(doctors_df)
-            schedule_df['date_parsed'] = pd.to_datetime(schedule_df[COL_DATE], errors='coerce')
-            schedule_sorted = schedule_df.sort_values('date_parsed')
-            
-            for _, row in schedule_sorted.iterrows():
-                date_str = row['date_parsed'].strftime('%d.%m.%Y')
-                weekday = WEEKDAYS_RO[row['date_parsed'].weekday()]
-                doctor = name_map.get(row[COL_DOC_ID], f"ID {row[COL_DOC_ID]}")
-                shift = row[COL_SHIFT]
-                
-                export_lines.append(f"{weekday}, {date_str}: {shift} - {doctor}")
-            
-            export_content = "\n".join(export_lines)
-            
+        if not schedule_df.empty and st.checkbox("📤 Pregătește export"):
+            export_content = build_export_text(schedule_df, doctors_df)
+
             st.download_button(
                 label="📥 Descarcă Program (.txt)",
                 data=export_content,
@@ -590,7 +718,8 @@ def main():
         st.subheader("Listă Personal")
         
         # Editor pentru personal
-        if doctors_df.empty:
+        has_doctors = not doctors_df.empty
+        if not has_doctors:
             # DataFrame gol cu structura corectă
             doctors_df = pd.DataFrame({
                 COL_ID: [1],
@@ -643,8 +772,11 @@ def main():
                 # Validare
                 if edited_df[COL_ID].duplicated().any():
                     st.error("❌ Există ID-uri duplicate! Fiecare medic trebuie să aibă un ID unic.")
+                elif has_doctors and edited_df.equals(doctors_df):
+                    # Nicio modificare față de foaia încărcată - evităm rescrierea completă
+                    st.info("Nu există modificări de salvat.")
                 else:
-                    save_data("Doctors", edited_df)
+                    save_data(SHEET_DOCTORS, edited_df)
                     st.success("✅ Lista personalului a fost salvată!")
                     st.rerun()
 